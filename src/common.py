@@ -1,22 +1,130 @@
 #! /usr/bin/env python3
 
+import os
+import json
 import subprocess
 import numpy as np
 import pandas as pd
 import polars as pl
+import pyreadr
 from pathlib import Path
-from dataclasses import dataclass, field, fields
+from dataclasses import dataclass, field
+from functools import cache, cached_property
+from numba import njit
+from scipy.optimize import minimize
+
+from cmdstanpy import CmdStanModel, write_stan_json
+from cmdstanpy.stanfit.mcmc import CmdStanMCMC
 
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 
 import statsmodels.graphics.tsaplots as tsa_plots
 import statsmodels.tsa.statespace.sarimax as sarimax
+from statsmodels.iolib.summary import Summary
+from statsmodels.iolib.table import SimpleTable
 from statsmodels.tsa.seasonal import seasonal_decompose
 
-from sklearn.metrics import (
-    root_mean_squared_error as skl_rmse, 
-    mean_absolute_error as skl_mae, 
-    median_absolute_error as skl_mdae)
+
+@njit(cache=True)
+def undifference_simple_in_place(
+    vector: np.ndarray, prepends: np.ndarray, k_diff: int) -> None:
+    """
+    Reverse 'k_diff' rounds of simple/ordinary differencing in a single pass
+        over 'vector', overwriting 'vector' with the result
+
+    On input, the last 'len(vector) - k_diff' elements of 'vector' hold the
+        differenced series; the first 'k_diff' elements are ignored
+
+    'prepends' holds the first element of each differenced vector in the order
+        that differencing produced them, so the last element of 'prepends' is
+        the first one to be prepended during de-differencing
+
+    Each round of de-differencing prepends one element and takes the cumulative
+        sum; instead of allocating a new array for each round, each round keeps
+        a running sum ('accumulators') that lags one element behind the
+        previous round's running sum; each element of the differenced series
+        is read in the same iteration that its position is overwritten, so the
+        result can share memory with the input
+
+    The running sums use Kahan compensated summation so that floating-point
+        error does not accumulate along the vector
+    """
+
+    accumulators = np.zeros(k_diff, dtype=np.float64)
+    compensations = np.zeros(k_diff, dtype=np.float64)
+
+    for idx_1 in range(len(vector)):
+        for k in range(k_diff):
+            idx_2 = idx_1 - (k_diff - 1 - k)
+            if idx_2 < 0:
+                continue
+            elif idx_2 == 0:
+                accumulators[k] = prepends[-1-k]
+                compensations[k] = 0.
+                continue
+            elif k == 0:
+                addend = vector[idx_1]
+            else:
+                addend = accumulators[k-1]
+            compensated_addend = addend - compensations[k]
+            total = accumulators[k] + compensated_addend
+            compensations[k] = (total - accumulators[k]) - compensated_addend
+            accumulators[k] = total
+        vector[idx_1] = accumulators[k_diff-1]
+
+
+@njit(cache=True)
+def undifference_simple(
+    series: np.ndarray, prepends: np.ndarray, k_diff: int) -> np.ndarray:
+    """
+    Reverse 'k_diff' rounds of simple/ordinary differencing of 'series'
+    See 'undifference_simple_in_place'
+    """
+
+    result = np.empty(len(series) + k_diff, dtype=np.float64)
+    result[k_diff:] = series
+    undifference_simple_in_place(result, prepends, k_diff)
+
+    return result
+
+
+@njit(cache=True)
+def kahan_periodic_cumulative_sum_in_place(
+    vector: np.ndarray, seasonal_periods: int) -> None:
+    """
+    Calculate cumulative sums in a 1-dimensional array 'vector' by position 
+        in a period specified by 'seasonal_periods', using Kahan compensated 
+        summation with one compensation term per position in the period, and
+        overwrite 'vector' with the sums
+    """
+
+    compensations = np.zeros(seasonal_periods, dtype=np.float64)
+
+    for idx_1 in range(seasonal_periods, len(vector)):
+        idx_2 = idx_1 - seasonal_periods
+        period_idx = idx_1 % seasonal_periods
+        compensated_addend = vector[idx_1] - compensations[period_idx]
+        total = vector[idx_2] + compensated_addend
+        compensations[period_idx] = (
+            (total - vector[idx_2]) - compensated_addend)
+        vector[idx_1] = total
+
+
+@njit(cache=True)
+def kahan_periodic_cumulative_sum(
+    series: np.ndarray, seasonal_periods: int) -> np.ndarray:
+    """
+    Calculate cumulative sums in a 1-dimensional array 'series' by position 
+        in a period specified by 'seasonal_periods'
+    See 'kahan_periodic_cumulative_sum_in_place'
+    """
+
+    result = np.empty(len(series), dtype=np.float64)
+    result[:] = series
+    kahan_periodic_cumulative_sum_in_place(result, seasonal_periods)
+
+    return result
 
 
 @dataclass
@@ -40,12 +148,30 @@ class TimeSeriesDifferencing:
         Apply seasonal differencing to given time series vector
         """
 
+        if k_seasonal_diff == 0:
+            return series
+
+        # pre-allocate the prepended elements and a single working buffer for
+        #   the differences instead of re-allocating them on each iteration
+        prepends = np.empty(
+            k_seasonal_diff * seasonal_periods,
+            dtype=np.result_type(self.prepend_vector, series))
+        prepends_n = 0
+        buffer = np.empty_like(series)
+
         for _ in range(k_seasonal_diff):
-            self.prepend_vector = np.append(
-                self.prepend_vector, series[:seasonal_periods])
-            series = (
-                series[seasonal_periods:] - 
-                series[:-seasonal_periods])
+            period_start = series[:seasonal_periods]
+            prepends[prepends_n:prepends_n+len(period_start)] = period_start
+            prepends_n += len(period_start)
+
+            diff_len = max(0, len(series) - seasonal_periods)
+            np.subtract(
+                series[seasonal_periods:], series[:diff_len],
+                out=buffer[:diff_len])
+            series = buffer[:diff_len]
+
+        self.prepend_vector = np.append(
+            self.prepend_vector, prepends[:prepends_n])
 
         return series
 
@@ -56,25 +182,25 @@ class TimeSeriesDifferencing:
         """
 
         # input series must be a 1-dimensional array
-        assert (np.array(series.shape) > 1).sum() <= 1
+        assert is_array_one_dimensional(series)
 
         assert len(series) >= max(self.k_diff, self.k_seasonal_diff) 
         if self.k_seasonal_diff > 0:
             assert self.seasonal_periods >= 1
 
-        series = series.copy()
-        series = series.reshape(-1)
-        self.original_vector = series
+        series = np.ascontiguousarray(series).ravel()
+        self.original_vector = series.copy()
 
         # seasonal differencing
         series = self.difference_time_series_seasonal(
             series, self.k_seasonal_diff, self.seasonal_periods)
 
         # simple/ordinary differencing
-        diff_vectors = [
-            np.diff(series, k, axis=0) for k in range(self.k_diff+1)]
-        series = diff_vectors[-1] 
-        prepends = np.array([dfv[0] for dfv in diff_vectors[:-1]])
+        prepends = np.empty(
+            self.k_diff, dtype=np.result_type(self.prepend_vector, series))
+        for k in range(self.k_diff):
+            prepends[k] = series[0]
+            series = np.diff(series, axis=0)
         self.prepend_vector = np.append(self.prepend_vector, prepends)
         self.final_difference_vector = series
 
@@ -91,15 +217,14 @@ class TimeSeriesDifferencing:
         """
 
         # input series must be a 1-dimensional array
-        assert (np.array(series.shape) > 1).sum() <= 1
+        assert is_array_one_dimensional(series)
 
         assert (self.k_diff + self.k_seasonal_diff) <= len(series)
         if self.k_seasonal_diff > 0:
             assert self.seasonal_periods >= 1
 
-        series = series.copy()
-        series = series.reshape(-1)
-        self.original_vector = series
+        series = np.ascontiguousarray(series).ravel()
+        self.original_vector = series.copy()
 
         # simple/ordinary differencing
         series = np.diff(series, self.k_diff, axis=0)
@@ -120,18 +245,15 @@ class TimeSeriesDifferencing:
         """
 
         # input series must be a 1-dimensional array
-        assert (np.array(series.shape) > 1).sum() <= 1
+        assert is_array_one_dimensional(series)
 
         assert len(series) > seasonal_periods
 
-        periods_n = len(series) - seasonal_periods
-        periodic_cumsum = series[:seasonal_periods]
-        for idx_1 in range(periods_n):
-            idx_2 = idx_1 + seasonal_periods
-            period_sum = np.array([periodic_cumsum[idx_1] + series[idx_2]])
-            periodic_cumsum = np.concatenate([periodic_cumsum, period_sum])
+        periodic_cumsum = kahan_periodic_cumulative_sum(
+            np.ascontiguousarray(series.reshape(-1), dtype=np.float64),
+            seasonal_periods)
 
-        return periodic_cumsum  
+        return periodic_cumsum
 
 
     def de_difference_time_series(
@@ -144,8 +266,9 @@ class TimeSeriesDifferencing:
             Control, 3rd edition, Prentice Hall, Inc., 1994) on page 12 suggest
             that the better term is 'summing'
 
-        NOTE:  as cumulative sums are added from the start to the end of the
-            vector, error from floating-point imprecision accumulates
+        NOTE:  cumulative sums are added from the start to the end of the
+            vector with Kahan compensated summation, so that error from 
+            floating-point imprecision does not accumulate along the vector
         """
 
         # INPUT PRE-CHECKS
@@ -157,8 +280,8 @@ class TimeSeriesDifferencing:
                 'run method "difference_time_series" on the vector first')
 
         # input series must be a 1-dimensional array
-        assert (np.array(series.shape) > 1).sum() <= 1
-        # if (np.array(series.shape) > 1).sum() > 1:
+        assert is_array_one_dimensional(series)
+        # if not is_array_one_dimensional(series):
         #     raise ValueError('Input series must be a 1-dimensional array')
 
         if series.size == 0:
@@ -167,54 +290,75 @@ class TimeSeriesDifferencing:
         if self.k_diff == 0 and self.k_seasonal_diff == 0:
             return series
 
-        series = series.copy()
-        series = series.reshape(-1)
-        original_vector = self.original_vector.copy()
-        original_vector = original_vector.reshape(-1)
+        series = np.ascontiguousarray(series).ravel()
 
         season_period_diff_len = self.k_seasonal_diff * self.seasonal_periods
         diff_total = self.k_diff + season_period_diff_len 
-        assert (len(series) + diff_total) == len(original_vector)
+        assert (len(series) + diff_total) == len(self.original_vector)
 
 
         # DE-DIFFERENCE TIME SERIES
         ##################################################
 
+        # all de-differencing is done in a single pre-allocated vector:  the
+        #   series to be de-differenced is written at its end, and each round
+        #   of de-differencing extends the active region ('start_idx' onward)
+        #   backwards by the number of elements that the round prepends
+        combined_vector = np.empty(len(self.original_vector), dtype=np.float64)
+        start_idx = len(combined_vector) - len(series)
+
         # if the given series is the final difference vector, pass original
-        #   difference vector along as the combined vector
-        if np.allclose(self.final_difference_vector, series):
+        #   difference vector along as the combined vector; check whether the
+        #   series is stored in the same memory as the final difference vector,
+        #   as when chaining differencing and de-differencing, before falling 
+        #   back to comparing all elements
+        is_final_difference_vector = (
+            series.shape == self.final_difference_vector.shape and
+            series.dtype == self.final_difference_vector.dtype and
+            series.ctypes.data == self.final_difference_vector.ctypes.data)
+        if (
+            is_final_difference_vector or 
+            np.allclose(self.final_difference_vector, series)):
             # could return 'original_vector' here for speed, but continuing
             #   through rest of code provides an important debugging scenario
-            combined_vector = series.copy()
+            combined_vector[start_idx:] = series
         # otherwise, sum the given vector with the final difference vector, 
         #   i.e., the given vector modifies the original differences
         else:
-            combined_vector = np.sum(
-                [series, self.final_difference_vector], axis=0)
+            np.add(
+                series, self.final_difference_vector, 
+                out=combined_vector[start_idx:])
 
         # simple de-differencing
-        p = None
-        for p in range(-1, -self.k_diff-1, -1):
-            prepend = np.array([self.prepend_vector[p]])
-            prepend_vector = np.concatenate([prepend, combined_vector])
-            combined_vector = np.cumsum(prepend_vector)
+        if self.k_diff > 0:
+            prepends_end_idx = len(self.prepend_vector)
+            prepends_start_idx = prepends_end_idx - self.k_diff
+            start_idx -= self.k_diff
+            undifference_simple_in_place(
+                combined_vector[start_idx:],
+                np.ascontiguousarray(
+                    self.prepend_vector[prepends_start_idx:prepends_end_idx],
+                    dtype=np.float64),
+                self.k_diff)
 
-        # remove/"pop" used elements from 'prepend_vector'
-        self.prepend_vector = self.prepend_vector[:p] 
+            # remove/"pop" used elements from 'prepend_vector'
+            self.prepend_vector = self.prepend_vector[:prepends_start_idx]
 
         for _ in range(self.k_seasonal_diff):
 
-            # end_idx = self.k_seasonal_diff * self.seasonal_periods
             end_idx = len(self.prepend_vector)
-            start_idx = end_idx - self.seasonal_periods
-            prepend = self.prepend_vector[start_idx:end_idx]
-            prepend_vector = np.concatenate([prepend, combined_vector])
-            combined_vector = self.periodic_cumulative_sum(
-                prepend_vector, self.seasonal_periods)
+            prepends_start_idx = end_idx - self.seasonal_periods
+            start_idx -= self.seasonal_periods
+            combined_vector[start_idx:start_idx+self.seasonal_periods] = (
+                self.prepend_vector[prepends_start_idx:end_idx])
+            kahan_periodic_cumulative_sum_in_place(
+                combined_vector[start_idx:], self.seasonal_periods)
 
             # remove/"pop" used elements from 'prepend_vector'
             self.prepend_vector = self.prepend_vector[:-self.seasonal_periods]
 
+        assert start_idx == 0
+
         return combined_vector  
 
 
@@ -223,11 +367,29 @@ def get_git_root_path() -> Path | None:
     Returns the top-level project directory where the Git repository is defined
     """
 
+    return find_git_root_path(Path.cwd())
+
+
+@cache
+def find_git_root_path(path: Path) -> Path | None:
+    """
+    Returns the top-level directory of the Git repository that contains 'path'
+    Results are cached by 'path', so that repeated calls do not search the file
+        system or start a 'git' process again
+    """
+
+    # look for the '.git' directory (or file, for worktrees and submodules) in
+    #   'path' and its parents without starting a separate process
+    path = path.resolve()
+    for parent_path in [path, *path.parents]:
+        if (parent_path / '.git').exists():
+            return parent_path
+
     try:
         # Run the git command to get the top-level directory
         git_root = subprocess.check_output(
             ['git', 'rev-parse', '--show-toplevel'], 
-            stderr=subprocess.STDOUT)
+            cwd=path, stderr=subprocess.STDOUT)
         git_root_path = Path(git_root.decode('utf-8').strip())
         return git_root_path 
 
@@ -259,13 +421,542 @@ def write_list_to_text_file(
         append_or_overwrite = 'a'
 
     with open(text_filename, append_or_overwrite, encoding='utf-8') as txt_file:
-        for e in a_list:
-            txt_file.write(str(e))
-            txt_file.write('\n')
+        txt_file.write(''.join(str(e) + '\n' for e in a_list))
+
+
+def is_file_stale(filepath: Path, dependency_filepaths: list[Path]) -> bool:
+    """
+    Return 'True' if the file at 'filepath' does not exist or is older than any
+        of the files that it was generated from, at 'dependency_filepaths'
+    """
+
+    if not filepath.exists():
+        return True
+
+    file_mtime = filepath.stat().st_mtime
+
+    return any(e.stat().st_mtime > file_mtime for e in dependency_filepaths)
 
 
 def convert_path_to_relative_path_str(path: Path) -> str:
-    return str(path).replace(str(Path.cwd()), '.')
+    return os.path.relpath(path, Path.cwd())
+
+
+##################################################
+# DATA AND MODEL LOADING
+##################################################
+
+@cache
+def load_consumption_series(input_path: Path) -> np.ndarray:
+    """
+    Load 'Consumption' time series data from the 'uschange.rda' file as a 
+        contiguous 'float64' array, which Stan requires for its 'real' data
+    Parsing the R data file is slow, so its contents are saved to a Parquet 
+        file on the first run and read from that file on later runs, unless 
+        the R data file has changed
+    Results are cached by 'input_path', so the returned array is read-only to
+        protect the cached copy
+    """
+
+    input_filepath = input_path / 'uschange.rda'
+    cache_filepath = input_path / 'uschange.parquet'
+
+    if is_file_stale(cache_filepath, [input_filepath]):
+        df = pl.DataFrame(pyreadr.read_r(input_filepath)['uschange'])
+        df.write_parquet(cache_filepath)
+        time_series = df['Consumption'].to_numpy()
+    else:
+        time_series = pl.read_parquet(
+            cache_filepath, columns=['Consumption'])['Consumption'].to_numpy()
+
+    time_series = np.ascontiguousarray(time_series, dtype=np.float64)
+    time_series.flags.writeable = False
+
+    return time_series
+
+
+# directory where OpenCL installable client drivers (ICDs) register themselves
+OPENCL_VENDORS_PATH = Path('/etc/OpenCL/vendors')
+
+
+def is_opencl_available() -> bool:
+    """
+    Return 'True' if an OpenCL installable client driver (ICD) is registered
+    """
+
+    return OPENCL_VENDORS_PATH.is_dir() and any(
+        OPENCL_VENDORS_PATH.glob('*.icd'))
+
+
+@cache
+def get_cmdstan_model(stan_filepath: Path) -> CmdStanModel:
+    """
+    Compile the Stan model at 'stan_filepath' once, so that it can be sampled 
+        from repeatedly
+    'CmdStanModel' reuses an existing executable that is newer than the Stan 
+        file instead of recompiling it, so an existing executable must be 
+        deleted for changes to the compiler options to take effect
+
+    The model is compiled with the Stan compiler's '-O1' optimizations and with
+        C++ optimizations; if an OpenCL driver is registered, the model is
+        compiled to use OpenCL on the first device of the first platform, and 
+        if that compilation fails, e.g., because the OpenCL headers or library
+        are missing, the model is compiled again for the CPU only
+    """
+
+    stanc_options = {'O1': True}
+    cpp_options = {'STAN_THREADS': 'true', 'STAN_CPP_OPTIMS': 'true'}
+
+    if is_opencl_available():
+        opencl_stanc_options = stanc_options | {'use-opencl': True}
+        opencl_cpp_options = cpp_options | {
+            'STAN_OPENCL': 'true', 
+            'OPENCL_DEVICE_ID': 0, 
+            'OPENCL_PLATFORM_ID': 0}
+        try:
+            model = CmdStanModel(
+                stan_file=stan_filepath, stanc_options=opencl_stanc_options, 
+                cpp_options=opencl_cpp_options)
+            return model
+        except (RuntimeError, ValueError) as e:
+            print('Compiling Stan model with OpenCL failed:', e)
+            print('Compiling Stan model for CPU only')
+
+    model = CmdStanModel(
+        stan_file=stan_filepath, stanc_options=stanc_options, 
+        cpp_options=cpp_options)
+
+    return model
+
+
+@dataclass
+class StanRun:
+    """
+    Fitted Stan model with its summary table, which is calculated once so that
+        it can be reused without summarizing the draws again
+    """
+
+    fit: CmdStanMCMC
+    summary: pd.DataFrame
+
+
+def is_stan_fit_converged(
+    summary_df: pd.DataFrame, max_r_hat: float=1.01, min_ess: float=400
+    ) -> bool:
+    """
+    Check whether all quantities in a Stan summary table have a potential scale
+        reduction factor ('R_hat') below 'max_r_hat' and an effective sample
+        size of at least 'min_ess'
+    Newer versions of CmdStan report bulk effective sample size ('ESS_bulk')
+        while older versions report 'N_Eff'
+    """
+
+    if 'ESS_bulk' in summary_df.columns:
+        ess = summary_df['ESS_bulk']
+    else:
+        ess = summary_df['N_Eff']
+
+    # quantities that are constant across draws have undefined 'R_hat', which
+    #   'max' and 'min' skip
+    is_converged = (
+        summary_df['R_hat'].max() < max_r_hat and ess.min() >= min_ess)
+
+    return bool(is_converged)
+
+
+@njit(cache=True)
+def sum_geyer_autocorrelations(rho: np.ndarray) -> float:
+    """
+    Calculate the integrated autocorrelation time from the autocorrelations 
+        'rho' at lags 0, 1, 2, ... with Geyer's initial monotone sequence 
+        estimator, as Stan does:  the autocorrelations are summed in pairs of
+        consecutive lags while the pair sums are positive, and each pair sum is
+        capped at the previous one so that the sums do not increase
+    """
+
+    tau = -1.
+    previous_pair_sum = np.inf
+
+    for t in range(0, len(rho) - 1, 2):
+        pair_sum = rho[t] + rho[t+1]
+        # also stops at undefined autocorrelations
+        if not pair_sum > 0:
+            break
+        pair_sum = min(pair_sum, previous_pair_sum)
+        tau += 2 * pair_sum
+        previous_pair_sum = pair_sum
+
+    return tau
+
+
+def summarize_stan_draws(
+    draws: np.ndarray, column_names: list[str] | tuple[str, ...]
+    ) -> pd.DataFrame:
+    """
+    Summarize Stan draws with shape (draws, chains, columns), as returned by 
+        'CmdStanMCMC.draws(concat_chains=False)', in a table like that of 
+        'CmdStanMCMC.summary', but in-process instead of by running CmdStan's
+        'stansummary' to read the chains' CSV files again
+    The potential scale reduction factor ('R_hat') and effective sample size 
+        ('N_Eff') are calculated on chains that are split in half, as in Stan, 
+        but without rank-normalization; quantities that are constant across 
+        draws have undefined 'R_hat' and 'N_Eff'
+    """
+
+    # sampler diagnostics are excluded, except for the log density
+    column_idx = [
+        i for i, e in enumerate(column_names) 
+        if not e.endswith('__') or e == 'lp__']
+    draws = draws[:, :, column_idx]
+    names = [column_names[i] for i in column_idx]
+
+    draws_n, chains_n, quantities_n = draws.shape
+    pooled_draws = draws.reshape(-1, quantities_n)
+    means = pooled_draws.mean(axis=0)
+    std_devs = pooled_draws.std(axis=0, ddof=1)
+    quantiles = np.quantile(pooled_draws, [0.05, 0.5, 0.95], axis=0)
+
+    # splitting each chain in half lets 'R_hat' detect trends within chains
+    half_n = draws_n // 2
+    split_draws = np.concatenate(
+        [draws[:half_n], draws[half_n:(2*half_n)]], axis=1)
+    split_chains_n = split_draws.shape[1]
+    chain_means = split_draws.mean(axis=0)
+    within_var = split_draws.var(axis=0, ddof=1).mean(axis=0)
+    between_var = chain_means.var(axis=0, ddof=1)
+    var_plus = (half_n - 1) / half_n * within_var + between_var
+
+    # autocovariances of all split chains and quantities are calculated 
+    #   together with a batched real FFT, zero-padded to avoid wrap-around
+    fft_len = 2 * half_n
+    spectra = np.fft.rfft(split_draws - chain_means, n=fft_len, axis=0)
+    power = spectra.real ** 2 + spectra.imag ** 2
+    autocovariances = np.fft.irfft(power, n=fft_len, axis=0)[:half_n] / half_n
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r_hats = np.sqrt(var_plus / within_var)
+        rho = 1 - (within_var - autocovariances.mean(axis=1)) / var_plus
+    rho[0] = 1.
+
+    total_n = half_n * split_chains_n
+    ess = np.full(quantities_n, np.nan)
+    for i in range(quantities_n):
+        if within_var[i] > 0:
+            tau = sum_geyer_autocorrelations(rho[:, i])
+            ess[i] = min(total_n / tau, total_n * np.log10(total_n))
+    r_hats[~(within_var > 0)] = np.nan
+
+    summary_df = pd.DataFrame({
+        'Mean': means,
+        'MCSE': std_devs / np.sqrt(ess),
+        'StdDev': std_devs,
+        '5%': quantiles[0],
+        '50%': quantiles[1],
+        '95%': quantiles[2],
+        'N_Eff': ess,
+        'R_hat': r_hats},
+        index=names)
+
+    return summary_df
+
+
+def sample_stan_model(
+    model: CmdStanModel, stan_data: dict, output_path: Path,
+    inits: dict | None=None, iter_warmups: tuple[int, ...]=(1000, 2000)
+    ) -> StanRun:
+    """
+    Sample from the Stan model with a short warmup and check convergence of the
+        fit; if it has not converged, sample again with each longer warmup in
+        'iter_warmups' in turn
+    'inits' are initial parameter values, e.g., from a corresponding SARIMAX
+        model, which shorten the warmup that the sampler needs
+    """
+
+    # CmdStan reads data only as JSON or Rdump text, so the data are written
+    #   once and the file is reused for every sampling run instead of being
+    #   serialized again for each one
+    data_filepath = output_path / 'data.json'
+    write_stan_json(data_filepath, stan_data)
+
+    for iter_warmup in iter_warmups:
+
+        fit_model = model.sample(
+            data=data_filepath, chains=4, parallel_chains=4, threads_per_chain=1,
+            thin=1, seed=21520, inits=inits,
+            iter_warmup=iter_warmup, iter_sampling=3000,
+            adapt_delta=0.9, max_treedepth=10, output_dir=output_path,
+            show_progress=False)
+
+        # summary of means, sd, se, and quantiles for parameters, n_eff, & Rhat
+        fit_df = summarize_stan_draws(
+            fit_model.draws(concat_chains=False), fit_model.column_names)
+
+        if is_stan_fit_converged(fit_df):
+            break
+
+    assert is_stan_fit_converged(fit_df)
+
+    return StanRun(fit_model, fit_df)
+
+
+def write_stan_draws(
+    fit_model: CmdStanMCMC, output_path: Path, 
+    merged_format: str | None=None) -> None:
+    """
+    Save a manifest that lists the CSV files of draws that CmdStan has already
+        written for each chain, so that the draws are not serialized again
+    If 'merged_format' is 'parquet' or 'csv', all samples for all parameters, 
+        predicted values, and diagnostics are also merged across chains and 
+        saved as a single compressed Parquet file or CSV file, respectively
+        number of rows = number of 'iter_sampling' in 'CmdStanModel.sample' 
+        call times number of chains
+    """
+
+    chain_csv_filepaths = [
+        os.path.relpath(e, output_path) for e in fit_model.runset.csv_files]
+    manifest = {'chain_csv_files': chain_csv_filepaths}
+    output_filepath = output_path / 'draws_manifest.json'
+    with open(output_filepath, 'w', encoding='utf-8') as json_file:
+        json.dump(manifest, json_file, indent=4)
+
+    if merged_format is None:
+        return
+
+    draws_df = pl.from_pandas(fit_model.draws_pd(), rechunk=False)
+
+    # the draws' default integer index carries no information, so it is not 
+    #   saved; Polars' native CSV writer is much faster than pandas' writer
+    if merged_format == 'csv':
+        output_filepath = output_path / 'draws.csv'
+        draws_df.write_csv(output_filepath)
+    elif merged_format == 'parquet':
+        output_filepath = output_path / 'draws.parquet'
+        draws_df.write_parquet(
+            output_filepath, compression='zstd', compression_level=3)
+    else:
+        raise ValueError(f'Unknown format for merged draws: {merged_format}')
+
+
+def write_stan_summary(summary_df: pd.DataFrame, output_path: Path) -> None:
+    """
+    Save Stan summary table as a CSV file with the names of the parameters in
+        the first column, as 'pd.DataFrame.to_csv' would save it, but with 
+        Polars' faster CSV writer
+    """
+
+    output_filepath = output_path / 'summary.csv'
+    summary_pl_df = pl.from_pandas(summary_df).insert_column(
+        0, pl.Series('', summary_df.index.to_numpy(dtype=str)))
+    summary_pl_df.write_csv(output_filepath)
+
+
+##################################################
+# FAST ARMA MODEL
+##################################################
+
+@njit(cache=True, fastmath=True)
+def calculate_arma_css_residuals(
+    y: np.ndarray, intercept: float, phi: np.ndarray, theta: np.ndarray
+    ) -> np.ndarray:
+    """
+    Calculate residuals of an ARMA(p, q) model with the parameterization of 
+        'SARIMAX' with trend='c':
+
+        y[t] = intercept + sum(phi[i] * y[t-1-i]) + e[t] + sum(theta[j] * e[t-1-j])
+
+    Residuals are conditioned on the first 'p' observations, with residuals 
+        before them set to zero, so only the last 'len(y) - p' residuals are
+        returned
+    """
+
+    p = len(phi)
+    q = len(theta)
+    residuals = np.zeros(len(y), dtype=np.float64)
+
+    for t in range(p, len(y)):
+        prediction = intercept
+        for i in range(p):
+            prediction += phi[i] * y[t-1-i]
+        for j in range(q):
+            if t-1-j >= p:
+                prediction += theta[j] * residuals[t-1-j]
+        residuals[t] = y[t] - prediction
+
+    return residuals[p:]
+
+
+@njit(cache=True, fastmath=True)
+def calculate_arma_css(params: np.ndarray, y: np.ndarray, p: int, q: int) -> float:
+    """
+    Calculate the conditional sum of squares (CSS) of an ARMA(p, q) model, 
+        where 'params' holds the intercept, the 'p' AR coefficients, and the 
+        'q' MA coefficients, in that order
+    """
+
+    residuals = calculate_arma_css_residuals(
+        y, params[0], params[1:(p+1)], params[(p+1):(p+1+q)])
+
+    return (residuals * residuals).sum()
+
+
+@njit(cache=True)
+def constrain_invertible_ma(unconstrained: np.ndarray) -> np.ndarray:
+    """
+    Transform unconstrained values to MA coefficients of an invertible MA 
+        polynomial, 1 + sum(theta[j] * L**(j+1)), in the same way as 'SARIMAX':
+        each value is mapped to a partial autocorrelation in (-1, 1), and the
+        Durbin-Levinson recursion turns the partial autocorrelations into the
+        coefficients
+
+    Monahan, John F. 1984. "A Note on Enforcing Stationarity in 
+        Autoregressive-moving Average Models." Biometrika 71 (2): 403-404.
+    """
+
+    n = len(unconstrained)
+    if n == 0:
+        return np.empty(0, dtype=np.float64)
+
+    partial_autocorrelations = unconstrained / np.sqrt(1 + unconstrained**2)
+    coefficients = np.zeros((n, n), dtype=np.float64)
+    for k in range(n):
+        for i in range(k):
+            coefficients[k, i] = (
+                coefficients[k-1, i] + 
+                partial_autocorrelations[k] * coefficients[k-1, k-i-1])
+        coefficients[k, k] = partial_autocorrelations[k]
+
+    return coefficients[n-1, :]
+
+
+@njit(cache=True, fastmath=True)
+def calculate_arma_css_invertible(
+    unconstrained_params: np.ndarray, y: np.ndarray, p: int, q: int) -> float:
+    """
+    Calculate the conditional sum of squares (CSS) of an ARMA(p, q) model, 
+        where 'unconstrained_params' is ordered as in 'calculate_arma_css' but
+        holds unconstrained values in place of the 'q' MA coefficients
+    """
+
+    params = unconstrained_params.copy()
+    params[(p+1):(p+1+q)] = constrain_invertible_ma(
+        unconstrained_params[(p+1):(p+1+q)])
+
+    return calculate_arma_css(params, y, p, q)
+
+
+@dataclass
+class ArmaResult:
+    """
+    Results of 'fast_arma_fit' with the attributes and 'summary' method of 
+        'SARIMAXResultsWrapper' that the scripts use, so that the two can be 
+        used interchangeably
+    Like 'SARIMAXResultsWrapper.params', 'params' are ordered as the intercept,
+        the AR coefficients, the MA coefficients, and the error variance 
+        ('sigma2')
+    """
+
+    params: np.ndarray
+    param_names: list[str]
+    llf: float
+    nobs: int
+    order: tuple[int, int, int]
+
+
+    def summary(self) -> Summary:
+        """
+        Summary with a table of model information followed by a table of the
+            parameters
+        """
+
+        smry = Summary()
+
+        model_info = [
+            [f'CSS ARMA({self.order[0]}, {self.order[2]})'], 
+            [self.nobs], 
+            [f'{self.llf:.3f}']]
+        smry.tables.append(SimpleTable(
+            model_info, 
+            stubs=['Model:', 'No. Observations:', 'Log Likelihood'], 
+            title='ARMA Results'))
+
+        params = [[f'{e:.4f}'] for e in self.params]
+        smry.tables.append(SimpleTable(
+            params, headers=['coef'], stubs=self.param_names))
+
+        return smry
+
+
+# results of either 'SARIMAX' or 'fast_arma_fit'
+ArmaModelResult = sarimax.SARIMAXResultsWrapper | ArmaResult
+
+
+@dataclass
+class SarimaxView:
+    """
+    Parameters derived from the results of 'SARIMAX' or 'fast_arma_fit', each 
+        of which is calculated on first access and then reused
+    """
+
+    result: ArmaModelResult
+
+
+    @cached_property
+    def intercept(self) -> float:
+        return float(self.result.params[0])
+
+
+    @cached_property
+    def coefficients(self) -> np.ndarray:
+        """
+        AR coefficients followed by MA coefficients
+        """
+        return self.result.params[1:-1]
+
+
+    @cached_property
+    def sigma(self) -> float:
+        """
+        Standard deviation of the errors
+        """
+        return float(np.sqrt(self.result.params[-1]))
+
+
+def fast_arma_fit(y: np.ndarray, p: int, q: int) -> ArmaResult:
+    """
+    Fit ARMA(p, q) model with an intercept by minimizing the conditional sum of
+        squares (CSS) of its residuals, which is much faster than fitting the 
+        exact likelihood with the Kalman filter in 'SARIMAX'
+    Minimizing the CSS maximizes the Gaussian conditional likelihood with the 
+        error variance concentrated out, so that the variance estimate and the
+        log likelihood follow from the minimized CSS
+    """
+
+    y = np.ascontiguousarray(y, dtype=np.float64)
+
+    initial_params = np.zeros(1 + p + q, dtype=np.float64)
+    initial_params[0] = y.mean()
+
+    # the MA coefficients are optimized through their partial autocorrelations,
+    #   which keeps the model invertible for any 'q'; bounding each coefficient
+    #   separately does so only for q = 1
+    optimization = minimize(
+        calculate_arma_css_invertible, initial_params, args=(y, p, q), 
+        method='L-BFGS-B')
+
+    nobs = len(y) - p
+    sigma2 = optimization.fun / nobs
+    llf = -0.5 * nobs * (np.log(2 * np.pi * sigma2) + 1)
+
+    coefficients = optimization.x.copy()
+    coefficients[(p+1):] = constrain_invertible_ma(coefficients[(p+1):])
+    params = np.append(coefficients, sigma2)
+    param_names = (
+        ['intercept'] + 
+        [f'ar.L{i+1}' for i in range(p)] + 
+        [f'ma.L{j+1}' for j in range(q)] + 
+        ['sigma2'])
+
+    return ArmaResult(params, param_names, llf, nobs, (p, 0, q))
 
 
 ##################################################
@@ -276,6 +967,81 @@ def root_median_squared_error(y_true, y_pred):
     return np.sqrt(np.median((y_true - y_pred) ** 2))
 
 
+@njit(cache=True)
+def select_kth_smallest(arr: np.ndarray, k: int) -> float:
+    """
+    Return the 'k'-th smallest element (zero-indexed) of 'arr' by partially 
+        sorting 'arr' in place with Hoare's quickselect, so that on return all
+        elements before index 'k' are no larger than 'arr[k]'
+    """
+
+    lo = 0
+    hi = len(arr) - 1
+    while lo < hi:
+        pivot = arr[(lo + hi) // 2]
+        i = lo
+        j = hi
+        while i <= j:
+            while arr[i] < pivot:
+                i += 1
+            while arr[j] > pivot:
+                j -= 1
+            if i <= j:
+                arr[i], arr[j] = arr[j], arr[i]
+                i += 1
+                j -= 1
+        if k <= j:
+            hi = j
+        elif k >= i:
+            lo = i
+        else:
+            break
+
+    return arr[k]
+
+
+@njit(cache=True)
+def calculate_error_metrics(
+    y_true: np.ndarray, y_pred: np.ndarray
+    ) -> tuple[float, float, float, float]:
+    """
+    Calculate root mean squared error, root median squared error, mean absolute
+        error, and median absolute error in a single pass over the residuals
+
+    Squaring is monotonic for absolute values, so the middle order statistics 
+        of the absolute residuals provide both medians
+
+    If any residual is not finite, all four metrics are NaN; the selection of
+        the medians would otherwise silently mis-order NaNs
+    """
+
+    n = len(y_true)
+    abs_residuals = np.empty(n, dtype=np.float64)
+    squared_sum = 0.
+    abs_sum = 0.
+    for i in range(n):
+        abs_residual = abs(y_true[i] - y_pred[i])
+        if not np.isfinite(abs_residual):
+            return np.nan, np.nan, np.nan, np.nan
+        abs_residuals[i] = abs_residual
+        squared_sum += abs_residual * abs_residual
+        abs_sum += abs_residual
+
+    mid_idx = n // 2
+    upper_mid = select_kth_smallest(abs_residuals, mid_idx)
+    if n % 2 == 1:
+        lower_mid = upper_mid
+    else:
+        lower_mid = abs_residuals[:mid_idx].max()
+
+    rmse = np.sqrt(squared_sum / n)
+    rmdse = np.sqrt((lower_mid * lower_mid + upper_mid * upper_mid) / 2)
+    mae = abs_sum / n
+    mdae = (lower_mid + upper_mid) / 2
+
+    return rmse, rmdse, mae, mdae
+
+
 @dataclass
 class TimeSeriesMetrics:
     rmse: float
@@ -298,10 +1064,9 @@ def calculate_time_series_metrics(
     series_2 = series_2[-min_len:]
 
     # calculate metrics
-    rmse = skl_rmse(series_1, series_2).item()
-    rmdse = root_median_squared_error(series_1, series_2).item()
-    mae = skl_mae(series_1, series_2).item()
-    mdae = skl_mdae(series_1, series_2).item()
+    rmse, rmdse, mae, mdae = calculate_error_metrics(
+        np.asarray(series_1, dtype=np.float64), 
+        np.asarray(series_2, dtype=np.float64))
 
     metrics = TimeSeriesMetrics(rmse, rmdse, mae, mdae)
 
@@ -312,7 +1077,7 @@ def is_array_one_dimensional(arr: np.ndarray) -> bool:
     """
     Check if the array is one-dimensional
     """
-    return (np.array(arr.shape) > 1).sum() <= 1
+    return arr.ndim <= 1 or sum(1 for d in arr.shape if d > 1) <= 1
 
 
 def decompose_and_forecast_seasonal_naive(
@@ -356,15 +1121,15 @@ def decompose_and_forecast_seasonal_naive(
     decomposition = seasonal_decompose(
         time_series, model=decompose_model, period=period, two_sided=False)
 
-    time_series[test_start_idx-5:test_start_idx+5]
-    test_forecast_seasonal_naive = np.add(
-        last_observation,
-        decomposition.seasonal[test_start_idx:])
+    test_forecast_seasonal_naive = (
+        last_observation + decomposition.seasonal[test_start_idx:])
 
-    # replace NaNs with last observation carried forward
+    # replace NaNs with last observation carried forward:  each element takes
+    #   the index of the latest non-NaN element at or before its position
     nan_mask = np.isnan(test_forecast_seasonal_naive)
-    for idx in np.where(nan_mask)[0]:
-        test_forecast_seasonal_naive[idx] = test_forecast_seasonal_naive[idx-1]
+    fill_idx = np.where(~nan_mask, np.arange(len(nan_mask)), 0)
+    np.maximum.accumulate(fill_idx, out=fill_idx)
+    test_forecast_seasonal_naive = test_forecast_seasonal_naive[fill_idx]
 
 
     # PLOT DECOMPOSITION
@@ -387,7 +1152,8 @@ def calculate_forecasts_and_metrics(
     time_series: np.ndarray, test_start_idx: int, 
     model_result: sarimax.SARIMAXResultsWrapper, period: int, 
     decompose_additive: bool, plot_decomposition: bool=False,
-    decomposition_plot_filepath: Path=Path('plot.png')
+    decomposition_plot_filepath: Path=Path('plot.png'),
+    test_forecast_model: np.ndarray | None=None
     ) -> tuple[pd.DataFrame, pd.DataFrame]:
     """
     Produce naive, seasonal naive, and model forecasts and calculate metrics
@@ -403,6 +1169,9 @@ def calculate_forecasts_and_metrics(
         model ('True') or a multiplicative model ('False')
     plot_decomposition - whether to save a plot of the decomposition
     output_filepath - the filepath at which to save the decomposition plot
+    test_forecast_model - model forecast for the test portion of the time 
+        series, if it has already been calculated; if 'None', the forecast is
+        calculated from 'model_result'
     """
 
     # INPUT PRE-CHECKS AND SETTINGS
@@ -428,16 +1197,21 @@ def calculate_forecasts_and_metrics(
     # CALCULATE FORECASTS
     ##################################################
 
-    test_forecast_model = model_result.forecast(steps=len(test_series))
+    if test_forecast_model is None:
+        test_forecast_model = model_result.forecast(steps=len(test_series))
+    assert len(test_forecast_model) == len(test_series)
     test_forecast_naive = np.repeat(fittedvalues[-1], len(test_series))
     test_forecast_seasonal_naive = decompose_and_forecast_seasonal_naive(
         time_series, test_start_idx, fittedvalues[-1], period, 
         decompose_additive, plot_decomposition, decomposition_plot_filepath)
 
-    forecast_df = pd.DataFrame({
-        'naive_forecast': test_forecast_naive,
-        'test_forecast_seasonal_naive': test_forecast_seasonal_naive,
-        'model_forecast': test_forecast_model})
+    forecast_df = pd.DataFrame(
+        np.column_stack([
+            test_forecast_naive, test_forecast_seasonal_naive, 
+            np.asarray(test_forecast_model)]),
+        columns=[
+            'naive_forecast', 'test_forecast_seasonal_naive', 
+            'model_forecast'])
 
 
     # CALCULATE FORECAST METRICS
@@ -460,17 +1234,11 @@ def calculate_forecasts_and_metrics(
         train_metrics, test_metrics, test_metrics_naive, 
         test_metrics_seasonal_naive]
 
-    metrics_dict = {}
-    for metrics_class in metrics:
-        for field in fields(metrics_class):
-            field_value = getattr(metrics_class, field.name)
-            if field.name in metrics_dict:
-                metrics_dict[field.name].append(field_value)
-            else:
-                metrics_dict[field.name] = [field_value]
-
-    metrics_df = pd.DataFrame(metrics_dict)
-    metrics_df.index = ['train', 'test', 'test_naive', 'test_seasonal_naive']
+    metrics_arr = np.array([[m.rmse, m.rmdse, m.mae, m.mdae] for m in metrics])
+    metrics_df = pd.DataFrame(
+        metrics_arr, 
+        columns=['rmse', 'rmdse', 'mae', 'mdae'],
+        index=['train', 'test', 'test_naive', 'test_seasonal_naive'])
 
     return forecast_df, metrics_df
 
@@ -479,25 +1247,81 @@ def calculate_forecasts_and_metrics(
 # TIME SERIES PLOTS
 ##################################################
 
+# figures are kept by size and reused across plots, so that each plot does not 
+#   set up a new figure and canvas
+FIGURE_CACHE: dict[tuple[float, float], Figure] = {}
+
+
+def get_reusable_figure(figsize: tuple[float, float] | None=None) -> Figure:
+    """
+    Return a cleared figure of size 'figsize' (default:  matplotlib's default
+        figure size), reusing a previously created figure of that size if one 
+        exists
+    The figure is not managed by 'pyplot', so it is not affected by 'plt.clf' 
+        or 'plt.close'
+    """
+
+    if figsize is None:
+        figsize = tuple(plt.rcParams['figure.figsize'])
+
+    fig = FIGURE_CACHE.get(figsize)
+    if fig is None:
+        fig = Figure(figsize=figsize)
+        FIGURE_CACHE[figsize] = fig
+
+    fig.clf()
+
+    return fig
+
+
 def plot_time_series(
     time_series: np.ndarray, series_n_to_plot: int=1, title: str='Time Series',
     output_filepath: Path=Path('plot.png')) -> None:
 
     assert series_n_to_plot <= time_series.shape[0]
 
-    # plt.figure(figsize=(12, 3))
+    # fig = get_reusable_figure(figsize=(12, 3))
+    fig = get_reusable_figure()
+    ax = fig.add_subplot()
     for srs in time_series[:series_n_to_plot]:
-        plt.plot(srs, alpha=0.5)
+        ax.plot(srs, alpha=0.5)
+
+    ax.set_title(title)
+    ax.set_xlabel('Time Index')
+    ax.set_ylabel('Value')
 
-    plt.title(title)
-    plt.xlabel('Time Index')
-    plt.ylabel('Value')
+    fig.tight_layout()
+    fig.savefig(output_filepath)
 
-    plt.tight_layout()
-    plt.savefig(output_filepath)
+    fig.clf()
 
-    plt.clf()
-    plt.close()
+
+def calculate_autocorrelations(
+    ts: list[np.ndarray], lags_n: int) -> np.ndarray:
+    """
+    Calculate the autocorrelation function at lags 0 through 'lags_n' for each
+        series in 'ts', returned as a matrix with one row per series
+
+    All series are demeaned, zero-padded to a common length, and transformed
+        together with a single batched real FFT; zero-padding to at least twice
+        the longest series length avoids circular wrap-around, and the padding
+        does not change the normalized autocorrelations of shorter series
+    """
+
+    max_len = max(len(srs) for srs in ts)
+    fft_len = 2 * max_len
+
+    demeaned = np.zeros((len(ts), max_len))
+    for i, srs in enumerate(ts):
+        srs = np.asarray(srs, dtype=np.float64).reshape(-1)
+        demeaned[i, :len(srs)] = srs - srs.mean()
+
+    spectra = np.fft.rfft(demeaned, n=fft_len, axis=1)
+    power = spectra.real ** 2 + spectra.imag ** 2
+    autocovariances = np.fft.irfft(power, n=fft_len, axis=1)[:, :lags_n+1]
+    autocorrelations = autocovariances / autocovariances[:, :1]
+
+    return autocorrelations
 
 
 def plot_time_series_autocorrelation(
@@ -508,41 +1332,64 @@ def plot_time_series_autocorrelation(
         https://www.machinelearningplus.com/time-series/arima-model-time-series-forecasting-python/
     """
 
-    plt.rcParams.update({'figure.figsize': (16, 3*len(ts))})
+    fig = get_reusable_figure(figsize=(16, 3*len(ts)))
+    axes = fig.subplots(len(ts), 3, sharex=False, squeeze=False)
 
-    fig, axes = plt.subplots(len(ts), 3, sharex=False)
+    # default number of lags follows 'statsmodels' 'plot_acf'
+    lags_ns = [
+        min(int(np.ceil(10 * np.log10(len(srs)))), len(srs) - 1) for srs in ts]
+    autocorrelations = calculate_autocorrelations(ts, max(lags_ns))
 
     for i, _ in enumerate(ts):
         axes[i, 0].plot(ts[i]); axes[i, 0].set_title(f'Series #{i}')
-        tsa_plots.plot_acf(ts[i], ax=axes[i, 1])
+
+        # 95% confidence band from Bartlett's formula, as in 'plot_acf'
+        lags_n = lags_ns[i]
+        acf = autocorrelations[i, :lags_n+1]
+        acf_variance = np.ones(lags_n + 1) / len(ts[i])
+        acf_variance[0] = 0
+        acf_variance[2:] *= 1 + 2 * np.cumsum(acf[1:-1] ** 2)
+        confidence_bound = 1.96 * np.sqrt(acf_variance)
+
+        lags = np.arange(lags_n + 1)
+        axes[i, 1].stem(lags, acf)
+        axes[i, 1].fill_between(
+            lags, -confidence_bound, confidence_bound, alpha=0.25)
+        axes[i, 1].set_title('Autocorrelation')
+
         tsa_plots.plot_pacf(ts[i], ax=axes[i, 2])
 
-    plt.tight_layout()
-    plt.savefig(output_filepath)
-    plt.clf()
-    plt.close()
+    fig.tight_layout()
+    fig.savefig(output_filepath)
+    fig.clf()
 
 
 def plot_time_series_and_model_values_1(
     original_series: np.ndarray, model_result: sarimax.SARIMAXResultsWrapper,
-    output_filepath: Path=Path('plot.png')) -> None:
+    output_filepath: Path=Path('plot.png'), 
+    forecast: np.ndarray | None=None) -> None:
 
     train_steps_n = len(model_result.fittedvalues)
     forecast_steps_n = len(original_series) - train_steps_n
-    forecast = model_result.forecast(steps=forecast_steps_n)
+    if forecast is None:
+        forecast = model_result.forecast(steps=forecast_steps_n)
+    assert len(forecast) == forecast_steps_n
 
-    plt.plot(original_series, alpha=0.5, color='blue')
-    plt.plot(model_result.fittedvalues, alpha=0.5, color='green')
+    fig = get_reusable_figure()
+    ax = fig.add_subplot()
+
+    ax.plot(original_series, alpha=0.5, color='blue')
+    ax.plot(model_result.fittedvalues, alpha=0.5, color='green')
 
     forecast_idx = range(train_steps_n, train_steps_n + forecast_steps_n)
-    plt.plot(forecast_idx, forecast, alpha=0.5, color='orange')
+    ax.plot(forecast_idx, forecast, alpha=0.5, color='orange')
 
-    plt.title('Original series (blue), fitted values (green), forecast (orange)')
-    plt.tight_layout()
+    ax.set_title(
+        'Original series (blue), fitted values (green), forecast (orange)')
+    fig.tight_layout()
 
-    plt.savefig(output_filepath)
-    plt.clf()
-    plt.close()
+    fig.savefig(output_filepath)
+    fig.clf()
 
 
 def plot_time_series_and_model_values_2(
@@ -551,17 +1398,19 @@ def plot_time_series_and_model_values_2(
 
     prediction = model_result.predict(start=0, end=len(original_series))
 
-    plt.plot(original_series, alpha=0.5, color='blue')
-    plt.plot(prediction, alpha=0.5, color='green')
+    fig = get_reusable_figure()
+    ax = fig.add_subplot()
+
+    ax.plot(original_series, alpha=0.5, color='blue')
+    ax.plot(prediction, alpha=0.5, color='green')
 
-    plt.title(
+    ax.set_title(
         'Original series (blue), model values (green), fit vs. forecast (red)')
-    plt.axvline(x=len(model_result.fittedvalues), color='red', linestyle='--')
-    plt.tight_layout()
+    ax.axvline(x=len(model_result.fittedvalues), color='red', linestyle='--')
+    fig.tight_layout()
 
-    plt.savefig(output_filepath)
-    plt.clf()
-    plt.close()
+    fig.savefig(output_filepath)
+    fig.clf()
 
 
 def plot_time_series_and_model_values_3(
@@ -571,17 +1420,19 @@ def plot_time_series_and_model_values_3(
     simulations = model_result.simulate(
         nsimulations=len(original_series), repetitions=50).squeeze()
 
-    plt.plot(simulations, alpha=0.1, color='green')
-    plt.plot(original_series, alpha=0.9, color='blue')
+    fig = get_reusable_figure()
+    ax = fig.add_subplot()
+
+    ax.plot(simulations, alpha=0.1, color='green')
+    ax.plot(original_series, alpha=0.9, color='blue')
 
-    plt.title(
+    ax.set_title(
         'Original series (blue), simulated values based on model (green)')
-    plt.axvline(x=len(model_result.fittedvalues), color='red', linestyle='--')
-    plt.tight_layout()
+    ax.axvline(x=len(model_result.fittedvalues), color='red', linestyle='--')
+    fig.tight_layout()
 
-    plt.savefig(output_filepath)
-    plt.clf()
-    plt.close()
+    fig.savefig(output_filepath)
+    fig.clf()
 
 
 ##################################################
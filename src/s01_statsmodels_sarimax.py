@@ -1,8 +1,7 @@
 #! /usr/bin/env python3
 
+import os
 import numpy as np
-import polars as pl
-import pyreadr
 from pathlib import Path
 
 import statsmodels.tsa.statespace.sarimax as sarimax
@@ -12,6 +11,7 @@ try:
         write_list_to_text_file,
         plot_time_series,
         transcribe_fpp2_8_5_model_results,
+        load_consumption_series,
         )
 
 except:
@@ -19,6 +19,7 @@ except:
         write_list_to_text_file,
         plot_time_series,
         transcribe_fpp2_8_5_model_results,
+        load_consumption_series,
         )
 
 
@@ -28,11 +29,7 @@ def run_sarimax_model(
     Run SARIMAX model on the downloaded time series data from 'fpp2' textbook
     """
 
-    input_filepath = input_path / 'uschange.rda'
-    df = pyreadr.read_r(input_filepath)['uschange']
-    df = pl.DataFrame(pyreadr.read_r(input_filepath)['uschange'])
-
-    time_series = df['Consumption'].to_numpy()
+    time_series = load_consumption_series(input_path)
 
     # order, AR/p, d, MA/q
     order = (1, 0, 3)
@@ -87,8 +84,8 @@ def report_model_result_comparison(
         '## Downloaded time series data looks identical to Figure 8.7 in '
         '"fpp2" textbook')
     figure_8_7_filepath = input_path / 'fpp2_book' / 'Figure_8.7.png'
-    figure_8_7_relative_filepath = (
-        figure_8_7_filepath.__str__().replace(Path.cwd().__str__(), '../..'))
+    figure_8_7_relative_filepath = os.path.relpath(
+        figure_8_7_filepath, output_path)
     md.append('\n')
     md.append('![Image](' + figure_8_7_relative_filepath + '){width=640}')
     md.append('\n')
@@ -99,8 +96,8 @@ def report_model_result_comparison(
     md.append('## Results of "fpp2" textbook and SARIMAX models match')
     fpp2_results_filepath = (
         input_path / 'fpp2_book' / 'ARIMA(1,0,3)_results.png')
-    fpp2_results_relative_filepath = (
-        fpp2_results_filepath.__str__().replace(Path.cwd().__str__(), '../..'))
+    fpp2_results_relative_filepath = os.path.relpath(
+        fpp2_results_filepath, output_path)
     md.append('\n')
     md.append('![Image](' + fpp2_results_relative_filepath + '){width=640}')
     md.append('\n')
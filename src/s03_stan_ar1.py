@@ -1,121 +1,156 @@
 #! /usr/bin/env python3
 
+import argparse
+import os
 import numpy as np
-import polars as pl
-import pyreadr
 from pathlib import Path
 
 from cmdstanpy import CmdStanModel
-from cmdstanpy.stanfit.mcmc import CmdStanMCMC
 import statsmodels.tsa.statespace.sarimax as sarimax
 
 
 try:
     from src.common import (
         write_list_to_text_file,
+        is_file_stale,
+        ArmaModelResult,
+        SarimaxView,
+        fast_arma_fit,
+        StanRun,
+        write_stan_draws,
+        write_stan_summary,
+        load_consumption_series,
+        get_cmdstan_model,
+        sample_stan_model,
         )
 
 except:
     from common import (
         write_list_to_text_file,
+        is_file_stale,
+        ArmaModelResult,
+        SarimaxView,
+        fast_arma_fit,
+        StanRun,
+        write_stan_draws,
+        write_stan_summary,
+        load_consumption_series,
+        get_cmdstan_model,
+        sample_stan_model,
         )
 
 
-def load_data(input_path: Path) -> np.ndarray:
-    """
-    Load 'Consumption' time series data from the 'uschange.rda' file
-    """
-
-    input_filepath = input_path / 'uschange.rda'
-    df = pyreadr.read_r(input_filepath)['uschange']
-    df = pl.DataFrame(pyreadr.read_r(input_filepath)['uschange'])
-    time_series = df['Consumption'].to_numpy()
-
-    return time_series
-
-
-def run_sarimax_model(time_series: np.ndarray) -> sarimax.SARIMAXResultsWrapper:
+def run_sarimax_model(time_series: np.ndarray) -> ArmaModelResult:
     """
     Run SARIMAX model on the downloaded time series data from 'fpp2' textbook
     """
 
     # order, AR/p, d, MA/q
     order = (1, 0, 0)
+
+    # fitting by conditional sum of squares bypasses the Kalman filter in 
+    #   'SARIMAX'
+    if os.environ.get('USE_FAST_ARMA') == '1':
+        return fast_arma_fit(time_series, order[0], order[2])
+
     model_result = sarimax.SARIMAX(time_series, order=order, trend='c').fit()
     assert isinstance(model_result, sarimax.SARIMAXResultsWrapper)
 
     return model_result
 
 
+def get_stan_inits(sarimax_view: SarimaxView) -> dict:
+    """
+    Initialize the Stan parameters at the SARIMAX estimates, so that the Stan
+        sampler needs less warmup
+    """
+
+    inits = {
+        'alpha': sarimax_view.intercept,
+        'beta': sarimax_view.coefficients[0],
+        'sigma': sarimax_view.sigma}
+
+    return inits
+
+
 def run_stan_model(
-    stan_path: Path, time_series: np.ndarray, 
-    output_path: Path) -> CmdStanMCMC:
+    model: CmdStanModel, time_series: np.ndarray, 
+    output_path: Path, merged_draws_format: str | None=None, 
+    inits: dict | None=None) -> StanRun:
 
     stan_data = {
         'T': len(time_series), 
-        'y': time_series}
-
-    stan_filename = 's03_ar1.stan'
-    stan_filepath = stan_path / stan_filename
-    model = CmdStanModel(stan_file=stan_filepath)
+        'y': np.ascontiguousarray(time_series, dtype=np.float64)}
 
-    fit_model = model.sample(
-        data=stan_data, chains=4, thin=2, seed=21520,
-        iter_warmup=4000, iter_sampling=12000, #show_console=True, 
-        output_dir=output_path)
+    stan_result = sample_stan_model(model, stan_data, output_path, inits)
 
 
     # tabular summaries
     ##################################################
 
-    # text summary of means, sd, se, and quantiles for parameters, n_eff, & Rhat
-    fit_df = fit_model.summary()
-    output_filepath = output_path / 'summary.csv'
-    fit_df.to_csv(output_filepath, index=True)
+    write_stan_summary(stan_result.summary, output_path)
 
 
-    # all samples for all parameters, predicted values, and diagnostics
-    #   number of rows = number of 'iter_sampling' in 'CmdStanModel.sample' call
-    draws_df = fit_model.draws_pd()
-    output_filepath = output_path / 'draws.csv'
-    draws_df.to_csv(output_filepath, index=True)
+    # manifest of per-chain draws and, optionally, draws merged across chains
+    write_stan_draws(stan_result.fit, output_path, merged_draws_format)
 
-    return fit_model
+    return stan_result
 
 
-def compare_sarimax_stan_models(sarimax_result, stan_result):
+def compare_sarimax_stan_models(
+    sarimax_view: SarimaxView, stan_result: StanRun):
     """
     Compare coefficients for SARIMAX and Stan models
     """
 
-    fit_df = stan_result.summary()
+    # posterior means are taken directly from the draws, which avoids running
+    #   CmdStan's 'stansummary' over all parameters
+    alpha_mean = stan_result.fit.stan_variable('alpha').mean()
+    beta_mean = stan_result.fit.stan_variable('beta').mean()
+    sigma_mean = stan_result.fit.stan_variable('sigma').mean()
 
     # alpha/intercept
-    assert np.isclose(fit_df.iloc[1, 0], sarimax_result.params[0], atol=1e-2)
+    assert np.isclose(alpha_mean, sarimax_view.intercept, atol=1e-2)
 
     # beta/ar.L1
-    assert np.isclose(fit_df.iloc[2, 0], sarimax_result.params[1], atol=1e-2)
+    assert np.isclose(beta_mean, sarimax_view.coefficients[0], atol=1e-2)
 
     # sigma
-    assert np.isclose(
-        fit_df.iloc[3, 0], np.sqrt(sarimax_result.params[2]), atol=1e-2)
+    assert np.isclose(sigma_mean, sarimax_view.sigma, atol=1e-2)
 
     print('Results of SARIMAX and Stan models approximately match')
 
 
 def report_model_result(
-    output_path: Path, model_result: sarimax.SARIMAXResultsWrapper):
+    output_path: Path, model_result: ArmaModelResult, 
+    dependency_filepaths: list[Path]):
     """
     Save time series plots and model results from 'fpp2' textbook and SARIMAX
         model in markdown file
+    The report is saved only if it does not exist or is older than any of the
+        files at 'dependency_filepaths', so that an up-to-date report does not
+        require calculating the model summary again
     """
 
-    md_filepath = output_path / 'report.md'
+    # reports of the fast CSS fit and of the SARIMAX fit are saved apart, so 
+    #   that switching fitters does not leave the report of the other fitter 
+    #   looking up to date
+    if os.environ.get('USE_FAST_ARMA') == '1':
+        md_filepath = output_path / 'report_css_arma.md'
+        model_name = 'CSS ARMA'
+    else:
+        md_filepath = output_path / 'report.md'
+        model_name = 'SARIMAX'
+
+    if not is_file_stale(md_filepath, dependency_filepaths):
+        return
+
     md = []
 
-    md.append('## SARIMAX model results')
+    md.append(f'## {model_name} model results')
 
-    md.append(model_result.summary().as_html())
+    # coefficient table only
+    md.append(model_result.summary().tables[1].as_html())
 
     write_list_to_text_file(md, md_filepath, True)
 
@@ -126,6 +161,12 @@ def main():
         to ensure that Stan model is coded correctly
     """
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--merged-draws', choices=['parquet', 'csv'], 
+        help='also save posterior draws merged across chains in this format')
+    args = parser.parse_args()
+
     # set paths
     ##################################################
 
@@ -141,12 +182,23 @@ def main():
     # run and compare models
     ##################################################
 
-    time_series = load_data(input_path)
+    time_series = load_consumption_series(input_path)
     sarimax_result = run_sarimax_model(time_series)
-    stan_result = run_stan_model(stan_path, time_series, output_path)
-    compare_sarimax_stan_models(sarimax_result, stan_result)
-
-    report_model_result(output_path, sarimax_result)
+    sarimax_view = SarimaxView(sarimax_result)
+    stan_model = get_cmdstan_model(stan_path / 's03_ar1.stan')
+    stan_result = run_stan_model(
+        stan_model, time_series, output_path, args.merged_draws,
+        get_stan_inits(sarimax_view))
+    compare_sarimax_stan_models(sarimax_view, stan_result)
+
+    # the report depends on the data and on the code that fits the model, 
+    #   including the fitting functions in 'common'
+    report_dependency_filepaths = [
+        input_path / 'uschange.rda', 
+        Path(__file__).parent / 'common.py', 
+        Path(__file__)]
+    report_model_result(
+        output_path, sarimax_result, report_dependency_filepaths)
 
 
 
@@ -1,157 +1,231 @@
 #! /usr/bin/env python3
 
+import argparse
+import os
 import numpy as np
-import polars as pl
-import pyreadr
 from pathlib import Path
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
 
 from cmdstanpy import CmdStanModel
-from cmdstanpy.stanfit.mcmc import CmdStanMCMC
 import statsmodels.tsa.statespace.sarimax as sarimax
 
 
 try:
     from src.common import (
         write_list_to_text_file,
+        is_file_stale,
+        ArmaModelResult,
+        SarimaxView,
+        fast_arma_fit,
+        StanRun,
+        write_stan_draws,
+        write_stan_summary,
+        load_consumption_series,
+        get_cmdstan_model,
+        sample_stan_model,
         )
 
 except:
     from common import (
         write_list_to_text_file,
+        is_file_stale,
+        ArmaModelResult,
+        SarimaxView,
+        fast_arma_fit,
+        StanRun,
+        write_stan_draws,
+        write_stan_summary,
+        load_consumption_series,
+        get_cmdstan_model,
+        sample_stan_model,
         )
 
 
-def load_data(input_path: Path) -> np.ndarray:
-    """
-    Load 'Consumption' time series data from the 'uschange.rda' file
-    """
-
-    input_filepath = input_path / 'uschange.rda'
-    df = pyreadr.read_r(input_filepath)['uschange']
-    df = pl.DataFrame(pyreadr.read_r(input_filepath)['uschange'])
-    time_series = df['Consumption'].to_numpy()
-
-    return time_series
-
-
 def run_sarimax_model(
     time_series: np.ndarray, order: tuple[int, int, int]
-    ) -> sarimax.SARIMAXResultsWrapper:
+    ) -> ArmaModelResult:
     """
     Run SARIMAX model on the downloaded time series data from 'fpp2' textbook
     """
 
+    # fitting by conditional sum of squares bypasses the Kalman filter in 
+    #   'SARIMAX'
+    if os.environ.get('USE_FAST_ARMA') == '1':
+        return fast_arma_fit(time_series, order[0], order[2])
+
     model_result = sarimax.SARIMAX(time_series, order=order, trend='c').fit()
     assert isinstance(model_result, sarimax.SARIMAXResultsWrapper)
 
     return model_result
 
 
+def get_stan_inits(sarimax_view: SarimaxView) -> dict:
+    """
+    Initialize the Stan parameters at the SARIMAX estimates, so that the Stan
+        sampler needs less warmup
+    """
+
+    # individual AR coefficients of a stationary process may lie outside the
+    #   bounds of Stan's 'beta', so they are kept strictly inside them
+    inits = {
+        'alpha': sarimax_view.intercept,
+        'beta': np.clip(sarimax_view.coefficients, -0.99, 0.99),
+        'sigma': sarimax_view.sigma}
+
+    return inits
+
+
 def run_stan_model(
-    stan_path: Path, time_series: np.ndarray, order: tuple[int, int, int],
-    output_path: Path) -> CmdStanMCMC:
+    model: CmdStanModel, time_series: np.ndarray, 
+    order: tuple[int, int, int], output_path: Path, 
+    merged_draws_format: str | None=None, inits: dict | None=None
+    ) -> StanRun:
 
     stan_data = {
         'P': order[0], 
         'T': len(time_series), 
-        'y': time_series}
-
-    stan_filename = 's04_arp.stan'
-    stan_filepath = stan_path / stan_filename
-    model = CmdStanModel(stan_file=stan_filepath)
+        'y': np.ascontiguousarray(time_series, dtype=np.float64)}
 
-    fit_model = model.sample(
-        data=stan_data, chains=4, thin=2, seed=21520,
-        iter_warmup=4000, iter_sampling=12000, #show_console=True, 
-        output_dir=output_path)
+    stan_result = sample_stan_model(model, stan_data, output_path, inits)
 
 
     # tabular summaries
     ##################################################
 
-    # text summary of means, sd, se, and quantiles for parameters, n_eff, & Rhat
-    fit_df = fit_model.summary()
-    output_filepath = output_path / 'summary.csv'
-    fit_df.to_csv(output_filepath, index=True)
+    write_stan_summary(stan_result.summary, output_path)
 
 
-    # all samples for all parameters, predicted values, and diagnostics
-    #   number of rows = number of 'iter_sampling' in 'CmdStanModel.sample' call
-    draws_df = fit_model.draws_pd()
-    output_filepath = output_path / 'draws.csv'
-    draws_df.to_csv(output_filepath, index=True)
+    # manifest of per-chain draws and, optionally, draws merged across chains
+    write_stan_draws(stan_result.fit, output_path, merged_draws_format)
 
-    return fit_model
+    return stan_result
 
 
-def compare_sarimax_stan_models(sarimax_result, stan_result):
+def compare_sarimax_stan_models(
+    sarimax_view: SarimaxView, stan_result: StanRun):
     """
     Compare coefficients for SARIMAX and Stan models
     """
 
-    fit_df = stan_result.summary()
+    # posterior means are taken directly from the draws, which avoids running
+    #   CmdStan's 'stansummary' over all parameters
+    alpha_mean = stan_result.fit.stan_variable('alpha').mean()
+    beta_means = stan_result.fit.stan_variable('beta').mean(axis=0)
+    sigma_mean = stan_result.fit.stan_variable('sigma').mean()
 
     # alpha/intercept
-    assert np.isclose(fit_df.iloc[1, 0], sarimax_result.params[0], atol=1e-2)
+    assert np.isclose(alpha_mean, sarimax_view.intercept, atol=1e-2)
 
     # beta/ar.L#
-    beta_n = len(sarimax_result.params) - 2
-    assert np.allclose(
-        fit_df.iloc[2:(beta_n+2), 0], 
-        sarimax_result.params[1:(beta_n+1)], 
-        atol=1e-2)
+    assert len(beta_means) == len(sarimax_view.coefficients)
+    assert np.allclose(beta_means, sarimax_view.coefficients, atol=1e-2)
 
     # sigma
-    fit_df_sigma = fit_df.loc['sigma', 'Mean']
-    assert np.isclose(
-        fit_df_sigma, np.sqrt(sarimax_result.params[-1]), atol=2e-2)
+    assert np.isclose(sigma_mean, sarimax_view.sigma, atol=2e-2)
 
     print('Results of SARIMAX and Stan models approximately match')
 
 
 def report_model_result(
-    ar: int, output_path: Path, model_result: sarimax.SARIMAXResultsWrapper):
+    ar: int, output_path: Path, model_result: ArmaModelResult, 
+    dependency_filepaths: list[Path]):
     """
     Save time series plots and model results from 'fpp2' textbook and SARIMAX
         model in markdown file
+    The report is saved only if it does not exist or is older than any of the
+        files at 'dependency_filepaths', so that an up-to-date report does not
+        require calculating the model summary again
     """
 
-    md_filepath = output_path / f'report_{ar}.md'
+    # reports of the fast CSS fit and of the SARIMAX fit are saved apart, so 
+    #   that switching fitters does not leave the report of the other fitter 
+    #   looking up to date
+    if os.environ.get('USE_FAST_ARMA') == '1':
+        md_filepath = output_path / f'report_{ar}_css_arma.md'
+        model_name = 'CSS ARMA'
+    else:
+        md_filepath = output_path / f'report_{ar}.md'
+        model_name = 'SARIMAX'
+
+    if not is_file_stale(md_filepath, dependency_filepaths):
+        return
+
     md = []
 
-    md.append('## SARIMAX model results')
+    md.append(f'## {model_name} model results')
 
-    md.append(model_result.summary().as_html())
+    # coefficient table only
+    md.append(model_result.summary().tables[1].as_html())
 
     write_list_to_text_file(md, md_filepath, True)
 
 
+def compare_models_for_ar_order(
+    ar: int, time_series: np.ndarray, stan_model: CmdStanModel, 
+    report_dependency_filepaths: list[Path], 
+    merged_draws_format: str | None=None) -> None:
+    """
+    Fit SARIMAX and Stan AR(P) models for a single AR order, compare them, and
+        save the results to an output directory specific to that order
+    """
+
+    # order, AR/p, d, MA/q
+    order = (ar, 0, 0)
+    output_path = Path.cwd() / 'output' / 's04_arp' / f'ar{ar}'
+    output_path.mkdir(exist_ok=True, parents=True)
+
+    print(f'Comparing models for AR({ar})')
+
+    sarimax_result = run_sarimax_model(time_series, order)
+    sarimax_view = SarimaxView(sarimax_result)
+    stan_result = run_stan_model(
+        stan_model, time_series, order, output_path, merged_draws_format,
+        get_stan_inits(sarimax_view))
+    compare_sarimax_stan_models(sarimax_view, stan_result)
+
+    report_model_result(
+        ar, output_path, sarimax_result, report_dependency_filepaths)
+
+
 def main():
     """
     Compare Stan model that accommodates AR(P) with corresponding SARIMAX model
         to ensure that Stan model is coded correctly
     """
 
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        '--merged-draws', choices=['parquet', 'csv'], 
+        help='also save posterior draws merged across chains in this format')
+    args = parser.parse_args()
+
     input_path = Path.cwd() / 'input'
     src_path = Path.cwd() / 'src'
     stan_path = src_path / 'stan'
 
-    time_series = load_data(input_path)
-
-    for ar in range(1, 5):
-
-        # order, AR/p, d, MA/q
-        order = (ar, 0, 0)
-        output_path = Path.cwd() / 'output' / 's04_arp' / f'ar{ar}'
-        output_path.mkdir(exist_ok=True, parents=True)
-
-        print(f'Comparing models for AR({ar})')
-
-        sarimax_result = run_sarimax_model(time_series, order)
-        stan_result = run_stan_model(stan_path, time_series, order, output_path)
-        compare_sarimax_stan_models(sarimax_result, stan_result)
-
-        report_model_result(ar, output_path, sarimax_result)
+    time_series = load_consumption_series(input_path)
+
+    # the Stan model is compiled once and sampled for each AR order
+    stan_model = get_cmdstan_model(stan_path / 's04_arp.stan')
+
+    # the reports depend on the data and on the code that fits the models, 
+    #   including the fitting functions in 'common'
+    report_dependency_filepaths = [
+        input_path / 'uschange.rda', 
+        Path(__file__).parent / 'common.py', 
+        Path(__file__)]
+
+    # each AR order is an independent multi-minute fit with its own output
+    #   directory, so the orders are run concurrently; the time series is only
+    #   a few hundred values, so pickling it to each worker costs next to nothing
+    compare_models = partial(
+        compare_models_for_ar_order, time_series=time_series, 
+        stan_model=stan_model, 
+        report_dependency_filepaths=report_dependency_filepaths, 
+        merged_draws_format=args.merged_draws)
+    with ProcessPoolExecutor(max_workers=4) as executor:
+        list(executor.map(compare_models, range(1, 5)))
 
 
 if __name__ == '__main__':
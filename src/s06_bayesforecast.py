@@ -3,9 +3,8 @@
 # https://github.com/asael697/bayesforecast/blob/master/inst/stan/Sarima.stan 
 # https://github.com/asael697/bayesforecast/blob/master/R/Sarima.R
 
+import os
 import numpy as np
-import polars as pl
-import pyreadr
 from pathlib import Path
 
 import statsmodels.tsa.statespace.sarimax as sarimax
@@ -14,43 +13,110 @@ import statsmodels.tsa.statespace.sarimax as sarimax
 try:
     from src.common import (
         write_list_to_text_file,
+        is_file_stale,
+        ArmaModelResult,
+        fast_arma_fit,
+        load_consumption_series,
         )
 
 except:
     from common import (
         write_list_to_text_file,
+        is_file_stale,
+        ArmaModelResult,
+        fast_arma_fit,
+        load_consumption_series,
         )
 
 
-def load_data(input_path: Path) -> np.ndarray:
+def run_sarimax_model(
+    time_series: np.ndarray, order: tuple[int, int, int], 
+    cov_type: str | None=None) -> ArmaModelResult:
     """
-    Load 'Consumption' time series data from the 'uschange.rda' file
+    Run SARIMAX model on the downloaded time series data from 'fpp2' textbook
+    'cov_type' is passed to 'SARIMAX.fit'; if it is 'none', the covariance
+        matrix of the parameters, which the standard errors in the summary 
+        require, is not calculated
     """
 
-    input_filepath = input_path / 'uschange.rda'
-    df = pyreadr.read_r(input_filepath)['uschange']
-    df = pl.DataFrame(pyreadr.read_r(input_filepath)['uschange'])
-    time_series = df['Consumption'].to_numpy()
+    # fitting by conditional sum of squares bypasses the Kalman filter in 
+    #   'SARIMAX'
+    if os.environ.get('USE_FAST_ARMA') == '1':
+        return fast_arma_fit(time_series, order[0], order[2])
 
-    return time_series
+    model_result = sarimax.SARIMAX(
+        time_series, order=order, trend='c').fit(cov_type=cov_type)
+    assert isinstance(model_result, sarimax.SARIMAXResultsWrapper)
 
+    return model_result
 
-def run_sarimax_model(
-    time_series: np.ndarray, order: tuple[int, int, int]
-    ) -> sarimax.SARIMAXResultsWrapper:
+
+def write_sarimax_parameters(
+    sarimax_result: ArmaModelResult, output_path: Path):
     """
-    Run SARIMAX model on the downloaded time series data from 'fpp2' textbook
+    Save parameter names and estimates of SARIMAX model in CSV file
     """
 
-    model_result = sarimax.SARIMAX(time_series, order=order, trend='c').fit()
-    assert isinstance(model_result, sarimax.SARIMAXResultsWrapper)
+    output_filepath = output_path / 'sarimax_parameters.csv'
+    # a few rows of parameters are written directly instead of through a 
+    #   dataframe
+    csv_lines = ['param_names,params'] + [
+        f'{name},{param}' for name, param 
+        in zip(sarimax_result.param_names, sarimax_result.params)]
+    write_list_to_text_file(csv_lines, output_filepath, True)
 
-    return model_result
+
+def params_only_main(
+    time_series: np.ndarray, order: tuple[int, int, int], output_path: Path):
+    """
+    Fit SARIMAX model and save its parameters, without calculating the 
+        covariance matrix of the parameters, which only the report needs
+    """
+
+    sarimax_result = run_sarimax_model(time_series, order, cov_type='none')
+    write_sarimax_parameters(sarimax_result, output_path)
+
+
+def report_main(
+    time_series: np.ndarray, order: tuple[int, int, int], output_path: Path, 
+    dependency_filepaths: list[Path]):
+    """
+    Fit SARIMAX model and save its parameters and its summary in markdown file
+    The summary depends only on the data and on the code that fits the model,
+        so when it is up to date, the model is fit without the covariance
+        matrix of the parameters, as if no report were requested
+    """
+
+    # summaries of the fast CSS fit and of the SARIMAX fit are saved apart, so 
+    #   that switching fitters does not leave the summary of the other fitter 
+    #   looking up to date
+    if os.environ.get('USE_FAST_ARMA') == '1':
+        output_filepath = output_path / 'sarimax_summary_css_arma.md'
+        model_name = 'CSS ARMA'
+    else:
+        output_filepath = output_path / 'sarimax_summary.md'
+        model_name = 'SARIMAX'
+
+    if not is_file_stale(output_filepath, dependency_filepaths):
+        params_only_main(time_series, order, output_path)
+        return
+
+    sarimax_result = run_sarimax_model(time_series, order)
+
+    md = []
+    md.append(f'## {model_name} model results')
+    # coefficient table only
+    md.append(sarimax_result.summary().tables[1].as_html())
+    write_list_to_text_file(md, output_filepath, True)
+
+    write_sarimax_parameters(sarimax_result, output_path)
 
 
 def main():
     """
     Save results of SARIMAX model for ARMA order used in 'fpp2' textbook 
+    The summary report is saved only if the environment variable 
+        'WRITE_REPORT' is set to '1'
     """
 
 
@@ -61,10 +127,10 @@ def main():
     output_path = Path.cwd() / 'output' / 's06_bayesforecast' / 'statsmodels'
     output_path.mkdir(exist_ok=True, parents=True)
 
-    time_series = load_data(input_path)
+    time_series = load_consumption_series(input_path)
 
 
-    # RUN MODEL
+    # RUN MODEL AND SAVE MODEL RESULTS
     ##################################################
 
     # order, AR/p, d, MA/q
@@ -72,23 +138,15 @@ def main():
     # seasonal order, AR/P, D, MA/Q
     seasonal_order = (0, 0, 0)
 
-    sarimax_result = run_sarimax_model(time_series, order)
-
-
-    # SAVE MODEL RESULTS
-    ##################################################
-
-    output_filepath = output_path / 'sarimax_summary.md'
-    md = []
-    md.append('## SARIMAX model results')
-    md.append(sarimax_result.summary().as_html())
-    write_list_to_text_file(md, output_filepath, True)
-
-    output_filepath = output_path / 'sarimax_parameters.csv'
-    result_df = pl.DataFrame(
-        {'param_names': sarimax_result.param_names, 
-         'params': sarimax_result.params})
-    result_df.write_csv(output_filepath)
+    if os.environ.get('WRITE_REPORT') == '1':
+        # the summary depends on the fitting functions in 'common', too
+        dependency_filepaths = [
+            input_path / 'uschange.rda', 
+            Path(__file__).parent / 'common.py', 
+            Path(__file__)]
+        report_main(time_series, order, output_path, dependency_filepaths)
+    else:
+        params_only_main(time_series, order, output_path)
 
 
 if __name__ == '__main__':
@@ -1,6 +1,9 @@
  
+import math
 import pytest
+import os
 import numpy as np
+import pandas as pd
 
 from hypothesis import given, settings, reproduce_failure
 import hypothesis.strategies as st
@@ -18,11 +21,24 @@ from skforecast.metrics.metrics import (
 from pmdarima.utils import diff as pm_diff
 from pmdarima.utils import diff_inv as pm_diff_inv
 import statsmodels.tsa.statespace.sarimax as sarimax
-
-from src.common import (
+from statsmodels.tsa.stattools import acf as sm_acf
+from statsmodels.tsa.statespace.tools import constrain_stationary_univariate
+
+from common import (
+    calculate_arma_css_residuals,
+    calculate_autocorrelations,
+    calculate_error_metrics,
+    calculate_time_series_metrics,
+    constrain_invertible_ma,
+    fast_arma_fit,
     is_array_one_dimensional,
+    is_file_stale,
+    is_stan_fit_converged,
     root_median_squared_error,
+    SarimaxView,
+    summarize_stan_draws,
     TimeSeriesDifferencing,
+    undifference_simple,
     )
 
 
@@ -196,6 +212,82 @@ def test_median_squared_error_06():
     np.testing.assert_almost_equal(result, np.array([3]))
 
 
+@given(
+    low=st.integers(min_value=-1000, max_value=1000),
+    high=st.integers(min_value=-1000, max_value=1000),
+    arr_len=st.integers(min_value=1, max_value=1000),
+    seed=st.integers(min_value=1, max_value=1_000_000))
+@settings(print_blob=True, deadline=None)
+def test_calculate_error_metrics_01(
+    low: int, high: int, arr_len: int, seed: int):
+    """
+    Test valid input against 'scikit-learn' metrics
+    """
+    rng = np.random.default_rng(seed)
+    y1 = low + (high - low) * rng.random(arr_len)
+    y2 = low + (high - low) * rng.random(arr_len)
+    rmse, rmdse, mae, mdae = calculate_error_metrics(y1, y2)
+    np.testing.assert_almost_equal(rmse, skl_rmse(y1, y2))
+    np.testing.assert_almost_equal(rmdse, root_median_squared_error(y1, y2))
+    np.testing.assert_almost_equal(mae, skl_mae(y1, y2))
+    np.testing.assert_almost_equal(mdae, skl_mdae(y1, y2))
+
+
+@given(
+    arr_len=st.integers(min_value=1, max_value=1000),
+    seed=st.integers(min_value=1, max_value=1_000_000))
+@settings(print_blob=True, deadline=None)
+def test_calculate_error_metrics_02(arr_len: int, seed: int):
+    """
+    Test valid input with many tied residuals against 'scikit-learn' metrics
+    """
+    rng = np.random.default_rng(seed)
+    y1 = rng.integers(low=-3, high=3, size=arr_len).astype(np.float64)
+    y2 = rng.integers(low=-3, high=3, size=arr_len).astype(np.float64)
+    rmse, rmdse, mae, mdae = calculate_error_metrics(y1, y2)
+    np.testing.assert_almost_equal(rmse, skl_rmse(y1, y2))
+    np.testing.assert_almost_equal(rmdse, root_median_squared_error(y1, y2))
+    np.testing.assert_almost_equal(mae, skl_mae(y1, y2))
+    np.testing.assert_almost_equal(mdae, skl_mdae(y1, y2))
+
+
+@pytest.mark.parametrize('bad_value', [np.nan, np.inf, -np.inf])
+def test_calculate_error_metrics_03(bad_value: float):
+    """
+    Test input with a non-finite residual:  all metrics are NaN
+    """
+    y1 = np.array([1., 2., 3., 4.])
+    y2 = np.array([1., 2., bad_value, 4.])
+    result = calculate_error_metrics(y1, y2)
+    assert all(np.isnan(e) for e in result)
+
+    metrics = calculate_time_series_metrics(y1, y2)
+    assert np.isnan(metrics.rmse)
+    assert np.isnan(metrics.rmdse)
+    assert np.isnan(metrics.mae)
+    assert np.isnan(metrics.mdae)
+
+
+@given(
+    arr_len_1=st.integers(min_value=2, max_value=500),
+    arr_len_2=st.integers(min_value=2, max_value=500),
+    seed=st.integers(min_value=1, max_value=1_000_000))
+@settings(print_blob=True)
+def test_calculate_autocorrelations_01(
+    arr_len_1: int, arr_len_2: int, seed: int):
+    """
+    Test valid input of series with different lengths against 'statsmodels'
+        autocorrelation function
+    """
+    rng = np.random.default_rng(seed)
+    ts = [rng.normal(size=arr_len_1).cumsum(), rng.normal(size=arr_len_2)]
+    lags_n = min(arr_len_1, arr_len_2) - 1
+    result = calculate_autocorrelations(ts, lags_n)
+    for i, srs in enumerate(ts):
+        correct_result = sm_acf(srs, nlags=lags_n)
+        np.testing.assert_almost_equal(result[i], correct_result)
+
+
 @given(
     low=st.integers(min_value=-1000, max_value=1000),
     high=st.integers(min_value=-1000, max_value=1000),
@@ -844,6 +936,62 @@ def test_periodic_cumulative_sum_08():
     np.testing.assert_almost_equal(correct_result, result)
 
 
+def test_periodic_cumulative_sum_09():
+    """
+    Test valid input:  floating-point error does not accumulate along a long
+        series
+    """
+
+    seasonal_periods = 4
+    series = np.full(400_000, 0.1)
+
+    ts_diff = TimeSeriesDifferencing()
+    result = ts_diff.periodic_cumulative_sum(series, seasonal_periods)
+
+    correct_result = math.fsum(series[::seasonal_periods])
+
+    assert result[-seasonal_periods] == correct_result
+
+
+def test_undifference_simple_01():
+    """
+    Test valid input:  k_diff = 1
+    """
+
+    series = np.array([1., 1., 1., 1.])
+    prepends = np.array([1.])
+
+    result = undifference_simple(series, prepends, 1)
+
+    correct_result = np.array([1, 2, 3, 4, 5])
+
+    np.testing.assert_almost_equal(correct_result, result)
+
+
+@given(
+    arr_len=st.integers(min_value=0, max_value=1000),
+    k_diff=st.integers(min_value=1, max_value=6),
+    seed=st.integers(min_value=1, max_value=1_000_000))
+@settings(print_blob=True, deadline=None)
+def test_undifference_simple_02(arr_len: int, k_diff: int, seed: int):
+    """
+    Test valid input against repeated prepending and cumulative summing
+    """
+
+    rng = np.random.default_rng(seed)
+    series = rng.normal(size=arr_len)
+    prepends = rng.normal(size=k_diff)
+
+    result = undifference_simple(series, prepends, k_diff)
+
+    correct_result = series
+    for p in range(-1, -k_diff-1, -1):
+        correct_result = np.cumsum(
+            np.concatenate([np.array([prepends[p]]), correct_result]))
+
+    np.testing.assert_allclose(correct_result, result, rtol=1e-9, atol=1e-9)
+
+
 def test_de_difference_time_series_01():
     """
     Test invalid input:  no differencing before de-differencing
@@ -1436,3 +1584,214 @@ def test_de_difference_time_series_24(
     np.testing.assert_almost_equal(ts_diff_1, ts_diff_3b, decimal=3)
 
 
+
+
+def test_is_stan_fit_converged_01():
+    """
+    Test summary with converged quantities, including an undefined 'R_hat' for
+        a quantity that is constant across draws
+    """
+    summary_df = pd.DataFrame(
+        {'R_hat': [1.000, 1.005, np.nan], 'ESS_bulk': [4000, 2500, 12000]},
+        index=['lp__', 'mu', 'y_0'])
+    result = is_stan_fit_converged(summary_df)
+    assert result == True
+
+
+def test_is_stan_fit_converged_02():
+    """
+    Test summary with 'R_hat' that is too high
+    """
+    summary_df = pd.DataFrame(
+        {'R_hat': [1.000, 1.050], 'ESS_bulk': [4000, 2500]},
+        index=['lp__', 'mu'])
+    result = is_stan_fit_converged(summary_df)
+    assert result == False
+
+
+def test_is_stan_fit_converged_03():
+    """
+    Test summary from older CmdStan with effective sample size that is too low
+    """
+    summary_df = pd.DataFrame(
+        {'R_hat': [1.000, 1.005], 'N_Eff': [4000, 150]},
+        index=['lp__', 'mu'])
+    result = is_stan_fit_converged(summary_df)
+    assert result == False
+
+
+def test_calculate_arma_css_residuals_01():
+    """
+    Test residuals of ARMA(1, 1) model against residuals calculated by hand
+    """
+    y = np.array([1., 2., 4., 3.])
+    intercept = 0.5
+    phi = np.array([0.5])
+    theta = np.array([0.2])
+
+    # y[1] - (0.5 + 0.5 * y[0])
+    e_1 = 2 - (0.5 + 0.5 * 1)
+    # y[2] - (0.5 + 0.5 * y[1] + 0.2 * e_1)
+    e_2 = 4 - (0.5 + 0.5 * 2 + 0.2 * e_1)
+    # y[3] - (0.5 + 0.5 * y[2] + 0.2 * e_2)
+    e_3 = 3 - (0.5 + 0.5 * 4 + 0.2 * e_2)
+
+    result = calculate_arma_css_residuals(y, intercept, phi, theta)
+    correct_result = np.array([e_1, e_2, e_3])
+    np.testing.assert_almost_equal(result, correct_result)
+
+
+@pytest.mark.parametrize('order', [(0, 0, 1), (1, 0, 0), (2, 0, 0)])
+def test_fast_arma_fit_01(order: tuple[int, int, int]):
+    """
+    Test parameters of fast ARMA fit against 'SARIMAX', which fits the exact 
+        likelihood instead of the conditional sum of squares, so that the 
+        estimates should be close but not identical
+    """
+    rng = np.random.default_rng(21520)
+    errors = rng.normal(0, 0.6, 2000)
+    y = np.empty(len(errors))
+    y[0] = 0.8
+    for t in range(1, len(y)):
+        y[t] = 0.2 + 0.5 * y[t-1] + errors[t] + 0.3 * errors[t-1]
+
+    result = fast_arma_fit(y, order[0], order[2])
+    sarimax_result = sarimax.SARIMAX(y, order=order, trend='c').fit(disp=False)
+
+    assert result.param_names == sarimax_result.param_names
+    np.testing.assert_allclose(
+        result.params, sarimax_result.params, atol=1e-2)
+
+
+@given(
+    arr_len=st.integers(min_value=1, max_value=10),
+    seed=st.integers(min_value=1, max_value=1_000_000))
+@settings(print_blob=True, deadline=None)
+def test_constrain_invertible_ma_01(arr_len: int, seed: int):
+    """
+    Test valid input against the MA transformation of 'SARIMAX'
+    """
+    rng = np.random.default_rng(seed)
+    unconstrained = rng.normal(0, 3, arr_len)
+    result = constrain_invertible_ma(unconstrained)
+    correct_result = -constrain_stationary_univariate(unconstrained)
+    np.testing.assert_almost_equal(result, correct_result)
+
+
+def test_fast_arma_fit_02():
+    """
+    Test that a fit with several MA coefficients is invertible:  all roots of
+        the MA polynomial lie outside the unit circle
+    """
+    rng = np.random.default_rng(49103)
+    errors = rng.normal(0, 0.6, 500)
+    y = errors.copy()
+    y[1:] += 1.5 * errors[:-1]
+
+    result = fast_arma_fit(y, 1, 3)
+    theta = result.params[2:5]
+    roots = np.polynomial.polynomial.polyroots(np.concatenate(([1.], theta)))
+    assert (np.abs(roots) > 1).all()
+
+
+def test_is_file_stale_01(tmp_path):
+    """
+    Test file that does not exist
+    """
+    dependency_filepath = tmp_path / 'input.txt'
+    dependency_filepath.write_text('input')
+    result = is_file_stale(tmp_path / 'output.txt', [dependency_filepath])
+    assert result == True
+
+
+def test_is_file_stale_02(tmp_path):
+    """
+    Test file that is newer or older than its dependencies
+    """
+    dependency_filepath_1 = tmp_path / 'input_1.txt'
+    dependency_filepath_1.write_text('input')
+    dependency_filepath_2 = tmp_path / 'input_2.txt'
+    dependency_filepath_2.write_text('input')
+    filepath = tmp_path / 'output.txt'
+    filepath.write_text('output')
+    os.utime(dependency_filepath_1, (1_000, 1_000))
+    os.utime(dependency_filepath_2, (1_000, 1_000))
+    os.utime(filepath, (2_000, 2_000))
+
+    result = is_file_stale(
+        filepath, [dependency_filepath_1, dependency_filepath_2])
+    assert result == False
+
+    os.utime(dependency_filepath_2, (3_000, 3_000))
+    result = is_file_stale(
+        filepath, [dependency_filepath_1, dependency_filepath_2])
+    assert result == True
+
+
+def test_sarimax_view_01():
+    """
+    Test parameters derived from 'SARIMAX' results
+    """
+    rng = np.random.default_rng(21520)
+    y = rng.normal(0.5, 1, 100)
+    sarimax_result = sarimax.SARIMAX(
+        y, order=(2, 0, 1), trend='c').fit(disp=False)
+    result = SarimaxView(sarimax_result)
+
+    assert result.intercept == sarimax_result.params[0]
+    np.testing.assert_equal(result.coefficients, sarimax_result.params[1:4])
+    assert result.sigma == np.sqrt(sarimax_result.params[4])
+
+
+def test_summarize_stan_draws_01():
+    """
+    Test summary of independent draws, autocorrelated draws, a constant, and a
+        sampler diagnostic, which is excluded
+    The effective sample size of an AR(1) process with coefficient 'phi' is 
+        approximately the number of draws times (1 - phi) / (1 + phi)
+    """
+    draws_n = 3000
+    chains_n = 4
+    phi = 0.5
+    rng = np.random.default_rng(21520)
+
+    ar_draws = np.empty((draws_n, chains_n))
+    ar_draws[0] = rng.normal(0, 1, chains_n)
+    for t in range(1, draws_n):
+        ar_draws[t] = phi * ar_draws[t-1] + rng.normal(0, 1, chains_n)
+
+    draws = np.stack([
+        rng.normal(0, 1, (draws_n, chains_n)), 
+        ar_draws, 
+        np.full((draws_n, chains_n), 2.),
+        rng.random((draws_n, chains_n))], axis=2)
+    column_names = ['lp__', 'mu', 'sigma', 'accept_stat__']
+
+    result = summarize_stan_draws(draws, column_names)
+
+    assert result.index.to_list() == ['lp__', 'mu', 'sigma']
+    pooled_draws = draws.reshape(-1, 4)[:, :3]
+    np.testing.assert_almost_equal(result['Mean'], pooled_draws.mean(axis=0))
+    np.testing.assert_almost_equal(
+        result['50%'], np.median(pooled_draws, axis=0))
+
+    total_n = draws_n * chains_n
+    assert np.isclose(result.loc['lp__', 'N_Eff'], total_n, rtol=0.1)
+    assert np.isclose(
+        result.loc['mu', 'N_Eff'], total_n * (1 - phi) / (1 + phi), rtol=0.1)
+    assert result.loc[['lp__', 'mu'], 'R_hat'].max() < 1.01
+    assert np.isnan(result.loc['sigma', 'N_Eff'])
+    assert np.isnan(result.loc['sigma', 'R_hat'])
+
+
+def test_summarize_stan_draws_02():
+    """
+    Test that chains that have not mixed have a high 'R_hat'
+    """
+    rng = np.random.default_rng(21520)
+    draws = rng.normal(0, 1, (1000, 4, 1))
+    draws[:, 0, 0] += 5
+
+    result = summarize_stan_draws(draws, ['mu'])
+
+    assert result.loc['mu', 'R_hat'] > 1.1